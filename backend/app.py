@@ -7,13 +7,30 @@ from flask import (
     stream_with_context,
 )
 import os
-import json
+import functools
+import gzip
+import itertools
+import hashlib
+import mimetypes
+import mmap
+import re
 import sys
 import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
-from .llm_client import LLMClient, ChatSession, ChunkProcessor, ChunkData
-from typing import AsyncGenerator, Dict, Any, Optional, List
+import ijson
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+from .chat_store import LogChatStore, SQLiteChatStore, UringFileIO, json_dumps, json_loads
+from .llm_client import LLMClient, ChatSession, ChunkProcessor
+from typing import AsyncGenerator, Callable, Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass
 import asyncio
 
@@ -23,6 +40,7 @@ load_dotenv()
 # ベースパスの設定
 BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_PATH = os.path.join(BASE_PATH, "frontend", "dist")
+ASSETS_DIR = os.path.join(STATIC_PATH, "assets")
 CHATS_DIR = os.path.join(BASE_PATH, "chats")
 
 # アプリケーションの初期化
@@ -30,9 +48,113 @@ app = Flask(__name__, static_folder=STATIC_PATH)
 if not os.path.exists(CHATS_DIR):
     os.makedirs(CHATS_DIR)
 
-# ロガーの設定
+# ロガーの設定 (レベルはルートロガーの設定に従う)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+
+# チャットの保存形式
+# ("json": チャットごとの JSON ファイル, "sqlite": 単一の SQLite DB, "log": mmap 追記ログ)
+CHAT_STORAGE = os.getenv("CHAT_STORAGE", "json")
+if CHAT_STORAGE == "sqlite":
+    _CHAT_STORE = SQLiteChatStore(os.path.join(CHATS_DIR, "chats.sqlite3"))
+elif CHAT_STORAGE == "log":
+    _CHAT_STORE = LogChatStore(CHATS_DIR)
+else:
+    _CHAT_STORE = None
+
+# チャットファイルのエンコード形式 ("json" または バイナリの "msgpack")
+CHAT_FORMAT = os.getenv("CHAT_FORMAT", "json")
+_CHAT_EXT = ".json"
+_chat_loads: Callable[[Any], Any] = json_loads
+_chat_dumps: Callable[[Any], bytes] = json_dumps
+if CHAT_FORMAT == "msgpack":
+    if msgpack is None:
+        logger.warning("msgpack is not installed, storing chats as JSON")
+    else:
+        _CHAT_EXT = ".msgpack"
+        _chat_loads = functools.partial(msgpack.unpackb, raw=False)
+        _chat_dumps = functools.partial(msgpack.packb, use_bin_type=True)
+
+# JSON チャットファイルの I/O 方式 ("posix" または io_uring でまとめて発行する "uring")
+_URING_IO: Optional[UringFileIO] = None
+if os.getenv("CHAT_IO") == "uring":
+    try:
+        _URING_IO = UringFileIO()
+    except RuntimeError as e:
+        logger.warning("Falling back to posix chat file I/O: %s", e)
+
+# 読み込み済みチャットのキャッシュ (chat_id -> (data, (mtime_ns, size)))
+# mtime の分解能が粗いファイルシステムでも更新を見逃さないようサイズも比較する
+_CACHE_MAX = 512
+_CHAT_CACHE: "OrderedDict[str, Tuple[Dict[str, Any], Tuple[int, int]]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+# チャットファイル読み書き時のバッファサイズ
+_IO_BUFFER_SIZE = 65536
+# これ以上のサイズのチャットファイルは mmap して読み込む
+MMAP_THRESHOLD = 65536
+
+# 古い形式のチャットファイル末尾から created_at を探すときに読むバイト数
+_TRAILER_READ_SIZE = 512
+_CREATED_AT_RE = re.compile(rb'"created_at"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+# チャット一覧用のインデックスファイル (chat_id -> {id, created_at, preview})
+# チャットファイル ({chat_id}.json) と名前が衝突しないようサブディレクトリに置く
+INDEX_DIRNAME = ".index"
+INDEX_FILENAME = "chats.json"
+_INDEX_LOCK = threading.Lock()
+# メモリ上のインデックス (初回アクセス時にファイルから読み込む)
+_INDEX: Optional[Dict[str, Dict[str, Any]]] = None
+# インデックス再構築時にチャットファイルを並行に読むスレッド数
+INDEX_REBUILD_WORKERS = 8
+
+# バックグラウンド保存 (chat_id -> (seq, data) の未書き込みデータ)
+_SAVE_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="chatsave")
+_SAVE_LOCKS = [threading.Lock() for _ in range(16)]
+_PENDING_LOCK = threading.Lock()
+_PENDING_SAVES: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+# 保存要求の通し番号 (書き込み中に新しい保存が来たかの判定に使う)
+_SAVE_SEQ = itertools.count(1)
+# 保存に失敗したときの再試行までの待ち時間 (秒)
+SAVE_RETRY_DELAYS = (1.0, 5.0, 30.0)
+
+# SSE のコンテンツチャンクをまとめて送る際の閾値
+SSE_BATCH_BYTES = 4096
+SSE_BATCH_DELAY = 0.02
+
+# SSE フレームのテンプレート (可変部分のみ JSON エンコードする)
+_SSE_CHUNK_PREFIX = b'data: {"chunk":'
+_SSE_TOOL_CALL_PREFIX = b'data: {"type":"tool_call","name":'
+_SSE_TOOL_RESULT_PREFIX = b'data: {"type":"tool_result","content":'
+_SSE_ERROR_PREFIX = b'data: {"error":'
+_SSE_SUFFIX = b'}\n\n'
+_SSE_DONE = b'data: {"done":true}\n\n'
+
+# 非同期処理を実行する常駐イベントループ
+_BG_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_BG_LOOP_LOCK = threading.Lock()
+
+# メモリ上に保持するフロントエンドの静的ファイル
+# (STATIC_PATH からの相対パス -> (本文, gzip 圧縮済み本文, MIME タイプ, ETag))
+# ビルド成果物のファイル名にはハッシュが含まれるため assets は長期キャッシュを許可する
+ASSET_MAX_AGE = 31536000
+GZIP_LEVEL = 6
+_ASSETS: Dict[str, Tuple[bytes, Optional[bytes], str, str]] = {}
+
+# メモリ上に保持するチャットセッションの上限
+MAX_SESSIONS = 1024
+
+# 秒単位でキャッシュした現在時刻の ISO 文字列 (epoch 秒, 文字列)
+_NOW_ISO: Tuple[int, str] = (0, "")
+
+
+def _now_iso() -> str:
+    """Return the current time as an ISO 8601 string at one-second resolution"""
+    global _NOW_ISO
+    now = int(time.time())
+    cached = _NOW_ISO
+    if cached[0] != now:
+        cached = _NOW_ISO = (now, datetime.fromtimestamp(now).isoformat())
+    return cached[1]
 
 
 @dataclass
@@ -40,27 +162,97 @@ class ChatManager:
     """Chat management class"""
     llm_client: LLMClient
     mcp_manager: Optional[Any] = None
-    sessions: Dict[str, ChatSession] = None
+    sessions: "OrderedDict[str, ChatSession]" = None
     tools: List[Dict] = None
+    # LiteLLM 形式に変換済みのツール定義 (initialize と refresh_tools で作る)
+    formatted_tools: Optional[List[Dict]] = None
+    max_sessions: int = MAX_SESSIONS
 
     def __post_init__(self):
-        self.sessions = {}
+        self.sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
 
     async def initialize(self):
         """Initialize chat manager and load tools"""
         if self.mcp_manager:
             self.tools = await self.mcp_manager.list_all_tools()
+            self.formatted_tools = self.llm_client.prepare_tools(self.tools) if self.tools else None
             logger.info(f"Loaded {len(self.tools)} tools")
+
+    async def aclose(self):
+        """Release the LLM client's pooled HTTP connections"""
+        await self.llm_client.aclose()
+
+    async def refresh_tools(self):
+        """Re-fetch the MCP tool lists and rebuild the formatted tools"""
+        if self.mcp_manager:
+            self.tools = await self.mcp_manager.refresh_tools()
+            self.formatted_tools = self.llm_client.prepare_tools(self.tools) if self.tools else None
+            logger.info(f"Refreshed {len(self.tools)} tools")
             
-    def get_or_create_session(self, chat_id: str, chunk_processor: ChunkProcessor) -> ChatSession:
-        """Get existing chat session or create a new one"""
-        if chat_id not in self.sessions:
-            self.sessions[chat_id] = ChatSession(
+    def get_or_create_session(
+        self, chat_id: str, chunk_processor: Optional[ChunkProcessor] = None
+    ) -> ChatSession:
+        """Get existing chat session or create a new one
+
+        Sessions are kept in LRU order and the least recently used ones are
+        dropped once more than max_sessions exist.
+        """
+        with self._sessions_lock:
+            session = self.sessions.get(chat_id)
+            if session is not None:
+                self.sessions.move_to_end(chat_id)
+                return session
+
+            session = self.sessions[chat_id] = ChatSession(
                 llm_client=self.llm_client,
                 mcp_manager=self.mcp_manager,
                 chunk_processor=chunk_processor
             )
-        return self.sessions[chat_id]
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+            return session
+
+
+def _preload_assets() -> Dict[str, Tuple[bytes, Optional[bytes], str, str]]:
+    """Read the built frontend into memory as (body, gzip body, mimetype, etag)"""
+    assets = {}
+    if not os.path.isdir(STATIC_PATH):
+        logger.warning(f"Frontend files not found in {STATIC_PATH}")
+        return assets
+    for dirpath, _, filenames in os.walk(STATIC_PATH):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                body = f.read()
+            # 圧縮しても小さくならないもの (画像など) は非圧縮のみ保持する
+            compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            if len(compressed) >= len(body):
+                compressed = None
+            mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            rel_path = os.path.relpath(path, STATIC_PATH).replace(os.sep, "/")
+            assets[rel_path] = (body, compressed, mimetype, hashlib.sha1(body).hexdigest())
+    return assets
+
+
+def _asset_response(rel_path: str, max_age: int) -> Optional[Response]:
+    """Build a response for a preloaded file, gzip-encoded when the client accepts it"""
+    asset = _ASSETS.get(rel_path)
+    if asset is None:
+        return None
+    body, compressed, mimetype, etag = asset
+    if compressed is not None and request.accept_encodings["gzip"] > 0:
+        response = Response(compressed, mimetype=mimetype)
+        response.headers["Content-Encoding"] = "gzip"
+        etag += "-gz"
+    else:
+        response = Response(body, mimetype=mimetype)
+    if compressed is not None:
+        response.vary.add("Accept-Encoding")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
 
 
 def create_app(mcp_manager=None):
@@ -70,35 +262,124 @@ def create_app(mcp_manager=None):
         mcp_manager=mcp_manager
     )
     app.chat_manager = chat_manager
+    _ASSETS.update(_preload_assets())
+    # 既存の JSON チャットファイルを設定された保存先へ一度だけ移す
+    if _CHAT_STORE is not None:
+        _migrate_json_chats(_CHAT_STORE.save, CHAT_STORAGE)
+    elif _CHAT_EXT != ".json":
+        _migrate_json_chats(_write_chat_file, CHAT_FORMAT)
+    _get_background_loop()
     return app, chat_manager
 
 
-class SSEChunkProcessor(ChunkProcessor):
-    """Server-Sent Events chunk processor"""
-    def __init__(self):
-        self.chunks = []
+def _stat_key(st: os.stat_result) -> Tuple[int, int]:
+    """Return the (mtime_ns, size) pair used to validate cache entries"""
+    return st.st_mtime_ns, st.st_size
+
+
+def _cache_put(chat_id: str, data: Dict[str, Any], key: Tuple[int, int]) -> None:
+    """Insert or refresh a cache entry, evicting the least recently used one"""
+    with _CACHE_LOCK:
+        _CHAT_CACHE[chat_id] = (data, key)
+        _CHAT_CACHE.move_to_end(chat_id)
+        while len(_CHAT_CACHE) > _CACHE_MAX:
+            _CHAT_CACHE.popitem(last=False)
+
+
+def _copy_chat(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy chat data so callers can append messages without touching the cache"""
+    return {**data, "messages": list(data["messages"])}
+
+
+def _write_atomic(
+    path: str,
+    payload: bytes,
+    before_replace: Optional[Callable[[Tuple[int, int]], None]] = None,
+) -> None:
+    """Write payload to a temporary file in CHATS_DIR and rename it over path
+
+    Readers never observe a partially written file. before_replace is called
+    with the new file's (st_mtime_ns, st_size) just before the rename.
+    """
+    with tempfile.NamedTemporaryFile(
+        "wb", buffering=_IO_BUFFER_SIZE, dir=CHATS_DIR, suffix=".tmp", delete=False
+    ) as tmp:
+        try:
+            if _URING_IO is not None:
+                _URING_IO.write(tmp.fileno(), payload)
+            else:
+                tmp.write(payload)
+            tmp.flush()
+            if before_replace is not None:
+                before_replace(_stat_key(os.fstat(tmp.fileno())))
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+
+
+@functools.lru_cache(maxsize=_CACHE_MAX)
+def _chat_path(chat_id: str) -> str:
+    """Return the file path for a chat"""
+    return os.path.join(CHATS_DIR, f"{chat_id}{_CHAT_EXT}")
 
-    async def process_chunk(self, chunk: ChunkData) -> None:
-        """Process a chunk and store it"""
-        if chunk.type == "content":
-            self.chunks.append(chunk.content)
-        elif chunk.type in ["tool_name", "tool_args"]:
-            self.chunks.append({chunk.type: chunk.content})
+
+def _new_chat(chat_id: str) -> Dict[str, Any]:
+    """Create the data for a chat that has not been saved yet"""
+    # created_at を messages より前に置き、一覧用の要約が履歴を読まずに済むようにする
+    return {
+        "id": chat_id,
+        "created_at": _now_iso(),
+        "messages": [],
+    }
+
+
+def _summary_fields_first(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the chat with id and created_at ordered before messages
+
+    Files written by older versions end with created_at; writing it first
+    lets _read_chat_summary stop after the first message.
+    """
+    return {"id": data["id"], "created_at": data["created_at"], **data}
 
 
 def load_chat(chat_id: str) -> Dict[str, Any]:
     """Load chat history from file"""
     try:
-        chat_path = os.path.join(CHATS_DIR, f"{chat_id}.json")
-        if not os.path.exists(chat_path):
-            return {
-                "id": chat_id,
-                "messages": [],
-                "created_at": datetime.now().isoformat()
-            }
-        
-        with open(chat_path, "r") as f:
-            return json.load(f)
+        with _PENDING_LOCK:
+            pending = _PENDING_SAVES.get(chat_id)
+        if pending is not None:
+            return _copy_chat(pending[1])
+
+        if _CHAT_STORE is not None:
+            return _CHAT_STORE.load(chat_id) or _new_chat(chat_id)
+
+        chat_path = _chat_path(chat_id)
+        try:
+            key = _stat_key(os.stat(chat_path))
+        except FileNotFoundError:
+            return _new_chat(chat_id)
+
+        with _CACHE_LOCK:
+            cached = _CHAT_CACHE.get(chat_id)
+            if cached is not None and cached[1] == key:
+                _CHAT_CACHE.move_to_end(chat_id)
+                return _copy_chat(cached[0])
+
+        if _URING_IO is not None:
+            data = _chat_loads(_URING_IO.read_file(chat_path))
+        elif key[1] >= MMAP_THRESHOLD:
+            # 大きな履歴はページキャッシュを直接パースし、bytes へのコピーを省く
+            with open(chat_path, "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                    memoryview(mm) as view:
+                data = _chat_loads(view)
+        else:
+            with open(chat_path, "rb", buffering=_IO_BUFFER_SIZE) as f:
+                data = _chat_loads(f.read())
+        _cache_put(chat_id, data, key)
+        return _copy_chat(data)
     except Exception as e:
         logger.error(f"Error loading chat {chat_id}: {e}")
         raise
@@ -107,30 +388,259 @@ def load_chat(chat_id: str) -> Dict[str, Any]:
 def save_chat(chat_id: str, data: Dict[str, Any]) -> None:
     """Save chat history to file"""
     try:
-        with open(os.path.join(CHATS_DIR, f"{chat_id}.json"), "w") as f:
-            json.dump(data, f)
-            logger.debug(f"Chat {chat_id} saved successfully")
+        if _CHAT_STORE is not None:
+            _CHAT_STORE.save(chat_id, data)
+            return
+
+        chat_path = _chat_path(chat_id)
+        _write_atomic(
+            chat_path,
+            _chat_dumps(_summary_fields_first(data)),
+            # 置き換え前にキャッシュを更新し、直後の読み込みでディスクを読まずに済ませる
+            lambda key: _cache_put(chat_id, _copy_chat(data), key),
+        )
+        _update_index(data)
+        logger.debug("Chat %s saved successfully", chat_id)
     except Exception as e:
         logger.error(f"Error saving chat {chat_id}: {e}")
         raise
 
 
+def _save_chat_in_background(chat_id: str, data: Dict[str, Any]) -> None:
+    """Queue a chat save on the save pool and return immediately
+
+    Until the write lands, load_chat serves the queued data.
+    """
+    data = _copy_chat(data)
+    with _PENDING_LOCK:
+        _PENDING_SAVES[chat_id] = (next(_SAVE_SEQ), data)
+    _SAVE_POOL.submit(_save_chat_ordered, chat_id)
+
+
+def _save_chat_ordered(chat_id: str, attempt: int = 0) -> None:
+    """Write the latest queued save of a chat, if it has not landed yet
+
+    Queued tasks whose data was superseded by a newer save become no-ops.
+    A failed write keeps its data queued (so load_chat still serves it)
+    and is retried after SAVE_RETRY_DELAYS; after the last retry it stays
+    queued until the next save of the chat.
+    """
+    with _SAVE_LOCKS[hash(chat_id) % len(_SAVE_LOCKS)]:
+        with _PENDING_LOCK:
+            pending = _PENDING_SAVES.get(chat_id)
+        if pending is None:
+            return
+        seq, data = pending
+        try:
+            save_chat(chat_id, data)
+        except Exception:
+            if attempt < len(SAVE_RETRY_DELAYS):
+                delay = SAVE_RETRY_DELAYS[attempt]
+                logger.warning(f"Retrying save of chat {chat_id} in {delay}s")
+                timer = threading.Timer(
+                    delay, _SAVE_POOL.submit, (_save_chat_ordered, chat_id, attempt + 1)
+                )
+                timer.daemon = True
+                timer.start()
+            else:
+                logger.error(f"Giving up saving chat {chat_id}; it is kept in memory until its next save")
+            return
+        with _PENDING_LOCK:
+            # 書き込み中に新しい保存が来ていなければ未書き込みデータから外す
+            if _PENDING_SAVES.get(chat_id, (None,))[0] == seq:
+                del _PENDING_SAVES[chat_id]
+
+
+def _chat_summary(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the chat list entry for a chat"""
+    return {
+        "id": data["id"],
+        "created_at": data["created_at"],
+        "preview": (
+            data["messages"][0]["content"][:50]
+            if data["messages"]
+            else "New chat"
+        ),
+    }
+
+
+def _read_chat_summary(chat_path: str) -> Dict[str, Any]:
+    """Build the chat list entry by streaming only the needed fields from a chat file
+
+    Parsing stops at the first message. Files that store created_at after
+    the messages get it from the end of the file instead.
+    """
+    if _CHAT_EXT != ".json":
+        return _read_msgpack_summary(chat_path)
+    summary = {"id": None, "created_at": None, "preview": None}
+    with open(chat_path, "rb", buffering=_IO_BUFFER_SIZE) as f:
+        for prefix, event, value in ijson.parse(f):
+            if prefix == "id" and event == "string":
+                summary["id"] = value
+            elif prefix == "created_at" and event == "string":
+                summary["created_at"] = value
+            elif prefix == "messages.item.content" and event == "string":
+                summary["preview"] = value[:50]
+                break
+            elif prefix == "messages" and event == "end_array":
+                break
+        if summary["created_at"] is None:
+            summary["created_at"] = _read_trailing_created_at(f)
+    if summary["preview"] is None:
+        summary["preview"] = "New chat"
+    return summary
+
+
+def _read_trailing_created_at(f) -> Optional[str]:
+    """Read created_at from a chat file that stores it after the messages"""
+    # 古い形式では created_at が最後のキーなので、末尾だけを読めば足りる
+    size = f.seek(0, os.SEEK_END)
+    f.seek(max(size - _TRAILER_READ_SIZE, 0))
+    match = None
+    for match in _CREATED_AT_RE.finditer(f.read()):
+        pass
+    if match is not None:
+        return json_loads(match.group(1))
+    # 見つからなければファイル全体から探す
+    f.seek(0)
+    return next(ijson.items(f, "created_at"), None)
+
+
+def _migrate_json_chats(save: Callable[[str, Dict[str, Any]], None], target: str) -> None:
+    """Move existing JSON chat files into another storage
+
+    Each file is removed once save has stored it, so the import only runs
+    once. Files that cannot be imported are left in place.
+    """
+    migrated = 0
+    failed = 0
+    with os.scandir(CHATS_DIR) as entries:
+        paths = [
+            entry.path
+            for entry in entries
+            if entry.name[-5:] == ".json"
+            and entry.is_file(follow_symlinks=False)
+        ]
+    for path in paths:
+        chat_id = os.path.basename(path)[:-5]
+        try:
+            with open(path, "rb", buffering=_IO_BUFFER_SIZE) as f:
+                data = json_loads(f.read())
+            save(chat_id, data)
+        except Exception as e:
+            logger.error(f"Error migrating chat {chat_id}: {e}")
+            failed += 1
+            continue
+        os.remove(path)
+        migrated += 1
+    if migrated:
+        logger.info("Migrated %d chat files to %s", migrated, target)
+    if failed:
+        logger.warning(f"{failed} chat files were left in {CHATS_DIR} and are not shown")
+
+
+def _write_chat_file(chat_id: str, data: Dict[str, Any]) -> None:
+    """Write a chat file in the configured format without touching the cache or index"""
+    _write_atomic(_chat_path(chat_id), _chat_dumps(_summary_fields_first(data)))
+
+
+def _read_msgpack_summary(chat_path: str) -> Dict[str, Any]:
+    """Build the chat list entry from a MessagePack chat file
+
+    Only the first message is decoded; the rest are skipped without
+    building Python objects.
+    """
+    summary = {"id": None, "created_at": None, "preview": "New chat"}
+    with open(chat_path, "rb", buffering=_IO_BUFFER_SIZE) as f:
+        unpacker = msgpack.Unpacker(f, raw=False)
+        for _ in range(unpacker.read_map_header()):
+            key = unpacker.unpack()
+            if key == "messages":
+                count = unpacker.read_array_header()
+                if count:
+                    summary["preview"] = unpacker.unpack()["content"][:50]
+                    for _ in range(count - 1):
+                        unpacker.skip()
+            elif key in ("id", "created_at"):
+                summary[key] = unpacker.unpack()
+            else:
+                unpacker.skip()
+    return summary
+
+
+def _rebuild_index() -> Dict[str, Dict[str, Any]]:
+    """Rebuild the chat index by reading every chat file"""
+    with os.scandir(CHATS_DIR) as entries:
+        paths = [
+            entry.path
+            for entry in entries
+            if entry.name.endswith(_CHAT_EXT)
+            and entry.is_file(follow_symlinks=False)
+        ]
+    if _URING_IO is not None:
+        # io_uring ではまとめて投入した読み込みを一度のシステムコールで処理する
+        summaries = map(_chat_summary, map(_chat_loads, _URING_IO.read_files(paths)))
+        return {summary["id"]: summary for summary in summaries}
+    # 読み込みを並行に発行し、ファイル数分の待ち時間が積み重ならないようにする
+    with ThreadPoolExecutor(INDEX_REBUILD_WORKERS, "chatindex") as pool:
+        return {summary["id"]: summary for summary in pool.map(_read_chat_summary, paths)}
+
+
+def _index_path() -> str:
+    """Return the path of the chat index file"""
+    return os.path.join(CHATS_DIR, INDEX_DIRNAME, INDEX_FILENAME)
+
+
+def _write_index(index: Dict[str, Dict[str, Any]]) -> None:
+    """Write the chat index, replacing the old file atomically"""
+    path = _index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, json_dumps(index))
+
+
+def _load_index() -> Dict[str, Dict[str, Any]]:
+    """Load the chat index, rebuilding it from the chat files if missing"""
+    try:
+        with open(_index_path(), "rb", buffering=_IO_BUFFER_SIZE) as f:
+            return json_loads(f.read())
+    except FileNotFoundError:
+        logger.info("Chat index not found, rebuilding from chat files")
+        index = _rebuild_index()
+        _write_index(index)
+        return index
+
+
+def _get_index() -> Dict[str, Dict[str, Any]]:
+    """Return the in-memory chat index, loading it on first use
+
+    Must be called with _INDEX_LOCK held.
+    """
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = _load_index()
+    return _INDEX
+
+
+def _update_index(data: Dict[str, Any]) -> None:
+    """Upsert the list entry for a saved chat"""
+    with _INDEX_LOCK:
+        index = _get_index()
+        index[data["id"]] = _chat_summary(data)
+        _write_index(index)
+
+
 def list_chats():
     """List all available chats"""
     try:
-        chats = []
-        for filename in os.listdir(CHATS_DIR):
-            if filename.endswith(".json"):
-                chat_data = load_chat(filename[:-5])
-                chats.append({
-                    "id": chat_data["id"],
-                    "created_at": chat_data["created_at"],
-                    "preview": (
-                        chat_data["messages"][0]["content"][:50]
-                        if chat_data["messages"]
-                        else "New chat"
-                    ),
-                })
+        if _CHAT_STORE is not None:
+            index = {chat["id"]: chat for chat in _CHAT_STORE.list_chats()}
+        else:
+            with _INDEX_LOCK:
+                index = dict(_get_index())
+        with _PENDING_LOCK:
+            for _, data in _PENDING_SAVES.values():
+                index[data["id"]] = _chat_summary(data)
+        chats = list(index.values())
         return sorted(chats, key=lambda x: x["created_at"], reverse=True)
     except Exception as e:
         logger.error(f"Error listing chats: {e}")
@@ -141,134 +651,202 @@ async def process_chat_message(
     chat_manager: ChatManager,
     chat_id: str,
     user_message: str,
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[bytes, None]:
     """Process a chat message and generate streaming response"""
     try:
-        logger.debug(f"Starting process_chat_message for chat {chat_id}")
+        logger.debug("Starting process_chat_message for chat %s", chat_id)
         chat_data = load_chat(chat_id)
         
         # Add user message
         chat_data["messages"].append({
             "role": "user",
             "content": user_message,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         })
 
-        # Create chunk processor and get session
-        chunk_processor = SSEChunkProcessor()
-        session = chat_manager.get_or_create_session(chat_id, chunk_processor)
-        session.messages = chat_data["messages"]
+        # Get session
+        session = chat_manager.get_or_create_session(chat_id)
+        session.load_history(chat_data["messages"])
 
-        while True:
-            logger.debug("Starting new iteration of chat processing loop")
-            # Process message with tools
-            response = await session.llm_client.get_streaming_response(
-                messages=session.messages,
-                tools=chat_manager.tools,
-                tool_manager=chat_manager.mcp_manager,
-            )
+        tool_calls = []
+        try:
+            while True:
+                logger.debug("Starting new iteration of chat processing loop")
+                formatted_tools = chat_manager.formatted_tools
+                promoted = session.promoted_tools(chat_manager.tools)
+                if promoted is not None:
+                    formatted_tools = session.llm_client.prepare_tools(chat_manager.tools, promoted)
+                # Process message with tools
+                response = await session.llm_client.get_streaming_response(
+                    messages=session.context_messages(),
+                    tool_manager=chat_manager.mcp_manager,
+                    formatted_tools=formatted_tools,
+                )
+
+                content_chunks = []
+                tool_calls = []
+                # arguments は断片のリストとして溜め、確定時に一度だけ連結する
+                current_tool = {"id": None, "name": None, "arguments": []}
+
+                # Process response chunks
+                async for chunk_type, chunk in response:
+                    logger.debug("Processing chunk: type=%s, content=%.100s", chunk_type, chunk)
+                    if chunk_type == "content":
+                        content_chunks.append(chunk)
+                        yield _SSE_CHUNK_PREFIX + json_dumps(chunk) + _SSE_SUFFIX
+                    elif chunk_type == "tool_call_id":
+                        if current_tool["name"]:
+                            logger.debug("Adding completed tool call: %s", current_tool)
+                            # 確定したツール呼び出しは残りの応答を受信している間に実行を始める
+                            tool_calls.append(session.start_tool_call(
+                                session.create_tool_call(current_tool)
+                            ))
+                        current_tool = {"id": chunk, "name": None, "arguments": []}
+                    elif chunk_type == "tool_name":
+                        current_tool["name"] = chunk
+                        logger.debug("Tool call started: %s", chunk)
+                        yield _SSE_TOOL_CALL_PREFIX + json_dumps(chunk) + _SSE_SUFFIX
+                    elif chunk_type == "tool_args":
+                        current_tool["arguments"].append(chunk)
+
+                # Add the last tool call if exists
+                if current_tool["name"]:
+                    logger.debug("Adding final tool call: %s", current_tool)
+                    tool_calls.append(session.create_tool_call(current_tool))
+
+                # If no tool calls, break the loop
+                if not tool_calls:
+                    logger.debug("No more tool calls, breaking loop")
+                    break
 
-            content_chunks = []
-            tool_calls = []
-            current_tool = {"id": None, "name": None, "arguments": ""}
-
-            # Process response chunks
-            async for chunk_type, chunk in response:
-                logger.debug(f"Processing chunk: type={chunk_type}, content={chunk[:100] if isinstance(chunk, str) and len(chunk) > 100 else chunk}")
-                chunk_data = ChunkData(type=chunk_type, content=chunk)
-                await chunk_processor.process_chunk(chunk_data)
-
-                if chunk_type == "content":
-                    content_chunks.append(chunk)
-                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-                elif chunk_type == "tool_call_id":
-                    if current_tool["name"]:
-                        logger.debug(f"Adding completed tool call: {current_tool}")
-                        tool_calls.append(current_tool.copy())
-                    current_tool = {"id": chunk, "name": None, "arguments": ""}
-                elif chunk_type == "tool_name":
-                    current_tool["name"] = chunk
-                    logger.debug(f"Tool call started: {chunk}")
-                    yield f"data: {json.dumps({'type': 'tool_call', 'name': chunk})}\n\n"
-                elif chunk_type == "tool_args":
-                    current_tool["arguments"] = chunk
-
-            # Add the last tool call if exists
-            if current_tool["name"]:
-                logger.debug(f"Adding final tool call: {current_tool}")
-                tool_calls.append(current_tool.copy())
-
-            # If no tool calls, break the loop
-            if not tool_calls:
-                logger.debug("No more tool calls, breaking loop")
-                break
+                # Create assistant message with tool calls
+                assistant_message = session.create_assistant_message(content_chunks, tool_calls)
+                session.messages.append(assistant_message)
+                chat_data["messages"].append(assistant_message)
 
-            # Create assistant message with tool calls
-            assistant_message = {
-                "role": "assistant",
-                "content": "".join(content_chunks),
-                "tool_calls": [{
-                    "id": tool_call["id"],
-                    "type": "function",
-                    "function": {
-                        "name": tool_call["name"],
-                        "arguments": tool_call["arguments"],
-                    },
-                } for tool_call in tool_calls]
-            }
-            session.messages.append(assistant_message)
-
-            # Process tool calls and get results
-            logger.debug(f"Processing {len(tool_calls)} tool calls")
-            tool_messages = await session.process_tool_calls(tool_calls)
+                # Process tool calls and get results
+                logger.debug("Processing %d tool calls", len(tool_calls))
+                tool_messages = await session.process_tool_calls(tool_calls)
             
-            if tool_messages:
-                logger.debug(f"Received {len(tool_messages)} tool messages")
-                session.messages.extend(tool_messages)
-                for msg in tool_messages:
-                    logger.debug(f"Tool message: {msg}")
-                    yield f"data: {json.dumps({'type': 'tool_result', 'content': msg['content']})}\n\n"
-            else:
-                logger.debug("No tool messages received, breaking loop")
-                break
+                if tool_messages:
+                    logger.debug("Received %d tool messages", len(tool_messages))
+                    session.messages.extend(tool_messages)
+                    chat_data["messages"].extend(tool_messages)
+                    for msg in tool_messages:
+                        logger.debug("Tool message: %s", msg)
+                        yield _SSE_TOOL_RESULT_PREFIX + json_dumps(msg['content']) + _SSE_SUFFIX
+                else:
+                    logger.debug("No tool messages received, breaking loop")
+                    break
 
-            logger.debug("Completed tool processing loop iteration")
+                logger.debug("Completed tool processing loop iteration")
+        finally:
+            # 応答の失敗やクライアントの切断でターンが途中で終わったら、
+            # 先行して開始したツール呼び出しを止める
+            session.cancel_tool_calls(tool_calls)
 
         # Save final assistant message
         assistant_message = {
             "role": "assistant",
             "content": "".join(content_chunks),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
         logger.debug("Saving final assistant message")
         chat_data["messages"].append(assistant_message)
-        save_chat(chat_id, chat_data)
+        _save_chat_in_background(chat_id, chat_data)
 
-        yield f"data: {json.dumps({'done': True})}\n\n"
+        yield _SSE_DONE
 
     except Exception as e:
         logger.error(f"Error in process_chat_message: {e}", exc_info=True)
-        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        yield _SSE_ERROR_PREFIX + json_dumps(str(e)) + _SSE_SUFFIX
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background event loop, starting it on first use"""
+    global _BG_LOOP
+    with _BG_LOOP_LOCK:
+        if _BG_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="chat-event-loop", daemon=True
+            ).start()
+            _BG_LOOP = loop
+        return _BG_LOOP
 
 
 def process_async_gen(agen):
     """Process an async generator in a synchronous context"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
+    loop = _get_background_loop()
+
     def gen():
+        exhausted = False
         try:
             while True:
                 try:
-                    yield loop.run_until_complete(agen.__anext__())
+                    yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
                 except StopAsyncIteration:
+                    exhausted = True
                     break
         finally:
-            loop.close()
-    
+            if not exhausted:
+                asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
     return gen()
 
 
+async def batch_sse_frames(frames, max_bytes: int = SSE_BATCH_BYTES, max_delay: float = SSE_BATCH_DELAY):
+    """Coalesce consecutive content-chunk SSE frames into larger writes
+
+    The first frame is sent immediately to keep time-to-first-token low.
+    Content chunks are then buffered until max_bytes accumulate or max_delay
+    seconds pass. The delay is a timer on the wait for the next frame, so
+    buffered chunks are sent on time even while the upstream stalls. Any
+    other frame (tool call, tool result, done, error) flushes the buffer
+    together with itself.
+    """
+    loop = asyncio.get_running_loop()
+    buffer = []
+    buffered_bytes = 0
+    deadline = 0.0
+    first = True
+    next_frame = None
+    try:
+        while True:
+            next_frame = asyncio.ensure_future(frames.__anext__())
+            if buffer:
+                done, _ = await asyncio.wait((next_frame,), timeout=max(deadline - loop.time(), 0))
+                if not done:
+                    yield b"".join(buffer)
+                    buffer.clear()
+                    buffered_bytes = 0
+            try:
+                frame = await next_frame
+            except StopAsyncIteration:
+                break
+            if not buffer:
+                deadline = loop.time() + max_delay
+            buffer.append(frame)
+            buffered_bytes += len(frame)
+            if (
+                first
+                or not frame.startswith(_SSE_CHUNK_PREFIX)
+                or buffered_bytes >= max_bytes
+            ):
+                yield b"".join(buffer)
+                buffer.clear()
+                buffered_bytes = 0
+                first = False
+        if buffer:
+            yield b"".join(buffer)
+    finally:
+        # 途中で閉じられた場合は、待っている次のフレームを止めてから元のジェネレーターを閉じる
+        if next_frame is not None and not next_frame.done():
+            next_frame.cancel()
+            await asyncio.wait((next_frame,))
+        await frames.aclose()
+
+
 # API Routes
 @app.route("/api/chats", methods=["GET"])
 def get_chats():
@@ -287,11 +865,11 @@ def add_message(chat_id):
     """Add message to chat and get streaming response"""
     try:
         user_message = request.json.get("message", "")
-        logger.debug(f"Received message for chat {chat_id}: {user_message[:50]}...")
+        logger.debug("Received message for chat %s: %.50s...", chat_id, user_message)
 
         agen = process_chat_message(app.chat_manager, chat_id, user_message)
         return Response(
-            stream_with_context(process_async_gen(agen)),
+            stream_with_context(process_async_gen(batch_sse_frames(agen))),
             content_type="text/event-stream"
         )
 
@@ -305,6 +883,10 @@ def add_message(chat_id):
 def serve_frontend():
     """Serve frontend static files"""
     try:
+        # index.html はアセットのファイル名を参照するため毎回再検証させる
+        response = _asset_response("index.html", 0)
+        if response is not None:
+            return response
         return app.send_static_file("index.html")
     except Exception as e:
         logger.error(f"Error serving frontend: {e}")
@@ -315,7 +897,12 @@ def serve_frontend():
 def serve_assets(filename):
     """Serve static assets"""
     try:
-        return send_from_directory(os.path.join(app.static_folder, "assets"), filename)
+        response = _asset_response(f"assets/{filename}", ASSET_MAX_AGE)
+        if response is not None:
+            return response
+        return send_from_directory(
+            ASSETS_DIR, filename, conditional=True, max_age=ASSET_MAX_AGE
+        )
     except Exception as e:
         logger.error(f"Error serving asset {filename}: {e}")
         return str(e), 500
@@ -0,0 +1,442 @@
+import logging
+import mmap
+import os
+import queue
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+logger = logging.getLogger(__name__)
+
+
+# orjson が無い環境では標準の json で代用する (どちらも bytes を返す)
+if orjson is not None:
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+else:
+    import json
+
+    def json_loads(data) -> Any:
+        return json.loads(bytes(data))
+
+    def json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# メッセージの専用カラム以外のキーは extra に JSON で保存する
+_MESSAGE_COLUMNS = ("role", "content", "timestamp")
+
+# ログ形式のレコード長プレフィックスと初期ファイルサイズ
+_LENGTH = struct.Struct("<I")
+_MIN_LOG_SIZE = 4096
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT,
+    ts TEXT,
+    extra BLOB,
+    PRIMARY KEY (chat_id, seq)
+);
+CREATE INDEX IF NOT EXISTS chats_created_at ON chats (created_at);
+"""
+
+
+class SQLiteChatStore:
+    """Chat storage backed by a single SQLite database in WAL mode
+
+    Messages live in an append-only table keyed by (chat_id, seq), so saving
+    a chat only inserts the messages added since the last save.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_message(role: str, content: Optional[str], ts: Optional[str],
+                        extra: Optional[bytes]) -> Dict[str, Any]:
+        message = {"role": role, "content": content}
+        if extra:
+            message.update(json_loads(extra))
+        if ts is not None:
+            message["timestamp"] = ts
+        return message
+
+    def load(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """Load a chat, or return None if it does not exist"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT created_at FROM chats WHERE id = ?", (chat_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        messages = [
+            self._row_to_message(*r)
+            for r in conn.execute(
+                "SELECT role, content, ts, extra FROM messages"
+                " WHERE chat_id = ? ORDER BY seq",
+                (chat_id,),
+            )
+        ]
+        return {"id": chat_id, "messages": messages, "created_at": row[0]}
+
+    def save(self, chat_id: str, data: Dict[str, Any]) -> None:
+        """Persist a chat by appending the messages not yet stored"""
+        messages = data["messages"]
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO chats (id, created_at) VALUES (?, ?)",
+                (chat_id, data["created_at"]),
+            )
+            # seq は 0 から連番なので、主キーの末尾を引くだけで件数が分かる
+            row = conn.execute(
+                "SELECT seq FROM messages WHERE chat_id = ? ORDER BY seq DESC LIMIT 1",
+                (chat_id,),
+            ).fetchone()
+            stored = row[0] + 1 if row is not None else 0
+            if len(messages) < stored:
+                conn.execute(
+                    "DELETE FROM messages WHERE chat_id = ? AND seq >= ?",
+                    (chat_id, len(messages)),
+                )
+                stored = len(messages)
+            conn.executemany(
+                "INSERT INTO messages (chat_id, seq, role, content, ts, extra)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        chat_id,
+                        seq,
+                        message["role"],
+                        message.get("content"),
+                        message.get("timestamp"),
+                        self._extra(message),
+                    )
+                    for seq, message in enumerate(messages[stored:], start=stored)
+                ],
+            )
+        logger.debug("Appended %d messages to chat %s", len(messages) - stored, chat_id)
+
+    @staticmethod
+    def _extra(message: Dict[str, Any]) -> Optional[bytes]:
+        extra = {k: v for k, v in message.items() if k not in _MESSAGE_COLUMNS}
+        return json_dumps(extra) if extra else None
+
+    def list_chats(self) -> List[Dict[str, Any]]:
+        """List chats with their first-message preview, newest first"""
+        rows = self._connection().execute(
+            "SELECT c.id, c.created_at, ("
+            "  SELECT substr(m.content, 1, 50) FROM messages m"
+            "  WHERE m.chat_id = c.id ORDER BY m.seq LIMIT 1"
+            ") FROM chats c ORDER BY c.created_at DESC"
+        )
+        return [
+            {
+                "id": chat_id,
+                "created_at": created_at,
+                "preview": preview if preview is not None else "New chat",
+            }
+            for chat_id, created_at, preview in rows
+        ]
+
+
+class LogChatStore:
+    """Chat storage backed by one memory-mapped append-only log per chat
+
+    Each message is stored in ``{chat_id}.log`` as a little-endian uint32
+    length followed by the JSON-encoded message, so saving a chat only
+    copies the new records into the mapping. The file grows by doubling and
+    a zero length prefix marks the end of the log. ``{chat_id}.meta`` holds
+    the id, creation time and list preview.
+    """
+
+    def __init__(self, chats_dir: str):
+        self.chats_dir = chats_dir
+        self._lock = threading.Lock()
+        # chat_id -> (保存済みメッセージ数, ログの使用済みバイト数)
+        self._tails: Dict[str, Tuple[int, int]] = {}
+
+    def _path(self, chat_id: str, suffix: str) -> str:
+        return os.path.join(self.chats_dir, f"{chat_id}{suffix}")
+
+    @staticmethod
+    def _walk(mm: mmap.mmap) -> Iterator[Tuple[int, int]]:
+        """Yield the (start, end) offsets of each record in the mapping"""
+        offset = 0
+        while offset + _LENGTH.size <= len(mm):
+            (length,) = _LENGTH.unpack_from(mm, offset)
+            if length == 0:
+                break
+            start = offset + _LENGTH.size
+            offset = start + length
+            yield start, offset
+
+    def _read_messages(self, chat_id: str) -> List[Dict[str, Any]]:
+        messages = []
+        end = 0
+        try:
+            with open(self._path(chat_id, ".log"), "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        with memoryview(mm) as view:
+                            for start, end in self._walk(mm):
+                                messages.append(json_loads(view[start:end]))
+        except FileNotFoundError:
+            pass
+        self._tails[chat_id] = (len(messages), end)
+        return messages
+
+    def _read_meta(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(chat_id, ".meta"), "rb") as f:
+                return json_loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, chat_id: str, data: Dict[str, Any]) -> None:
+        messages = data["messages"]
+        meta = {
+            "id": chat_id,
+            "created_at": data["created_at"],
+            "preview": messages[0]["content"][:50] if messages else "New chat",
+        }
+        # 一覧表示中に書きかけの meta を読まないよう一時ファイル経由で置き換える
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=self.chats_dir, suffix=".tmp", delete=False
+        ) as tmp:
+            try:
+                tmp.write(json_dumps(meta))
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+        os.replace(tmp.name, self._path(chat_id, ".meta"))
+
+    def load(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """Load a chat, or return None if it does not exist"""
+        with self._lock:
+            meta = self._read_meta(chat_id)
+            if meta is None:
+                return None
+            messages = self._read_messages(chat_id)
+        return {"id": chat_id, "messages": messages, "created_at": meta["created_at"]}
+
+    def save(self, chat_id: str, data: Dict[str, Any]) -> None:
+        """Persist a chat by appending the messages not yet in its log"""
+        messages = data["messages"]
+        with self._lock:
+            if chat_id not in self._tails:
+                self._read_messages(chat_id)
+            stored, end = self._tails[chat_id]
+            if len(messages) < stored:
+                # 履歴が短くなった場合はログを書き直す
+                stored, end = 0, 0
+            if stored == 0 or self._read_meta(chat_id) is None:
+                self._write_meta(chat_id, data)
+
+            records = b"".join(
+                _LENGTH.pack(len(payload)) + payload
+                for payload in map(json_dumps, messages[stored:])
+            )
+            self._append(chat_id, end, records)
+            self._tails[chat_id] = (len(messages), end + len(records))
+        logger.debug("Appended %d messages to chat %s", len(messages) - stored, chat_id)
+
+    def _append(self, chat_id: str, end: int, records: bytes) -> None:
+        """Copy records into the log mapping at end, growing the file as needed"""
+        fd = os.open(self._path(chat_id, ".log"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            # 終端マーカー分の余白を残して容量を倍々で確保する
+            needed = end + len(records) + _LENGTH.size
+            if needed > size:
+                size = max(size * 2, needed, _MIN_LOG_SIZE)
+                os.ftruncate(fd, size)
+            with mmap.mmap(fd, size, access=mmap.ACCESS_WRITE) as mm:
+                mm[end:end + len(records)] = records
+                mm[end + len(records):end + len(records) + _LENGTH.size] = _LENGTH.pack(0)
+        finally:
+            os.close(fd)
+
+    def list_chats(self) -> List[Dict[str, Any]]:
+        """List chats from their meta files, newest first"""
+        chats = []
+        with os.scandir(self.chats_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".meta"):
+                    with open(entry.path, "rb") as f:
+                        chats.append(json_loads(f.read()))
+        return sorted(chats, key=lambda x: x["created_at"], reverse=True)
+
+
+class _UringOp:
+    """A queued read or write, resubmitted until the whole buffer is transferred"""
+    __slots__ = ("write", "fd", "buffer", "chunk", "done", "future")
+
+    def __init__(self, write: bool, fd: int, buffer):
+        self.write = write
+        self.fd = fd
+        self.buffer = buffer
+        # 今回投入するバッファ (短い読み書きの後は残り部分のコピー)
+        self.chunk = buffer
+        self.done = 0
+        self.future: Future = Future()
+
+    def complete(self, res: int) -> bool:
+        """Record a completion result and return True once the op is finished"""
+        if res < 0:
+            self.future.set_exception(OSError(-res, os.strerror(-res)))
+            return True
+        if not self.write and self.chunk is not self.buffer:
+            self.buffer[self.done:self.done + res] = self.chunk[:res]
+        self.done += res
+        # 読み込みは EOF (res == 0) でも終了
+        if res == 0 or self.done >= len(self.buffer):
+            self.future.set_result(self.done)
+            return True
+        if self.write:
+            self.chunk = self.buffer[self.done:]
+        else:
+            self.chunk = bytearray(len(self.buffer) - self.done)
+        return False
+
+
+class UringFileIO:
+    """Batch chat file reads and writes through a single io_uring instance
+
+    Any thread can queue an operation; a daemon thread submits everything
+    queued so far with one io_uring_submit and resolves the futures from the
+    completion queue. Requires the optional ``liburing`` package on Linux.
+    """
+
+    def __init__(self, entries: int = 64):
+        if liburing is None or not sys.platform.startswith("linux"):
+            raise RuntimeError("io_uring is not available on this platform")
+        self._entries = entries
+        self._queue: "queue.Queue[_UringOp]" = queue.Queue()
+        self._ring = liburing.Ring()
+        liburing.io_uring_queue_init(entries, self._ring)
+        threading.Thread(target=self._run, name="chat-uring", daemon=True).start()
+
+    def read_file(self, path: str) -> bytes:
+        """Read a whole file"""
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            buffer = bytearray(os.fstat(fd).st_size)
+            size = self._queue_op(_UringOp(False, fd, buffer)).result()
+        finally:
+            os.close(fd)
+        return bytes(buffer) if size == len(buffer) else bytes(buffer[:size])
+
+    def read_files(self, paths: List[str]) -> List[bytes]:
+        """Read many whole files, queueing a ring's worth of reads at a time
+
+        The reads of each group are picked up together and go to the kernel
+        in a single submission instead of one read() syscall per file.
+        """
+        results: List[bytes] = []
+        for start in range(0, len(paths), self._entries):
+            fds: List[int] = []
+            try:
+                for path in paths[start:start + self._entries]:
+                    fds.append(os.open(path, os.O_RDONLY))
+                ops = [
+                    _UringOp(False, fd, bytearray(os.fstat(fd).st_size)) for fd in fds
+                ]
+                for op in ops:
+                    self._queue_op(op)
+                for op in ops:
+                    size = op.future.result()
+                    results.append(bytes(op.buffer[:size]))
+            finally:
+                for fd in fds:
+                    os.close(fd)
+        return results
+
+    def write(self, fd: int, payload: bytes) -> None:
+        """Write payload to fd starting at offset 0"""
+        self._queue_op(_UringOp(True, fd, payload)).result()
+
+    def _queue_op(self, op: _UringOp) -> Future:
+        if not op.buffer:
+            op.future.set_result(0)
+        else:
+            self._queue.put(op)
+        return op.future
+
+    def _run(self) -> None:
+        retry: List[_UringOp] = []
+        cqe = liburing.Cqe()
+        while True:
+            batch = retry or [self._queue.get()]
+            retry = []
+            while len(batch) < self._entries:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._submit_and_reap(batch, retry, cqe)
+            except Exception as e:
+                logger.error("io_uring batch failed: %s", e, exc_info=True)
+                for op in batch:
+                    if not op.future.done():
+                        op.future.set_exception(e)
+                retry = []
+
+    def _submit_and_reap(self, batch: List[_UringOp], retry: List[_UringOp], cqe) -> None:
+        """Submit one batch and wait for all of its completions"""
+        for i, op in enumerate(batch):
+            sqe = liburing.io_uring_get_sqe(self._ring)
+            if op.write:
+                liburing.io_uring_prep_write(sqe, op.fd, op.chunk, op.done)
+            else:
+                liburing.io_uring_prep_read(sqe, op.fd, op.chunk, op.done)
+            liburing.io_uring_sqe_set_data64(sqe, i)
+        liburing.io_uring_submit(self._ring)
+
+        for _ in batch:
+            liburing.io_uring_wait_cqe(self._ring, cqe)
+            entry = cqe[0]
+            op = batch[liburing.io_uring_cqe_get_data64(entry)]
+            try:
+                res = entry.res
+            except OSError as e:
+                # liburing は負の結果を OSError として送出する
+                res = -e.errno
+            liburing.io_uring_cq_advance(self._ring, 1)
+            if not op.complete(res):
+                retry.append(op)
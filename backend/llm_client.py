@@ -1,18 +1,67 @@
 import os
-from typing import List, Dict, Any, Optional, AsyncGenerator, Union, Tuple, Protocol, Callable, Awaitable
+import re
+import sys
+import asyncio
+import queue
+import threading
+from typing import List, Dict, Any, Optional, AsyncGenerator, Union, Tuple, Protocol, Callable, Awaitable, Deque, FrozenSet
+import aiohttp
+from dotenv import load_dotenv
 from litellm import acompletion
 import logging
 import json
 from dataclasses import dataclass
+from collections import deque
+from itertools import islice
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# 以下の設定をインポート時に一度だけ解決するため、先に .env を読み込んでおく
+load_dotenv()
+
+# LLM の呼び出し設定
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "claude-3-haiku-latest")
+TEMPERATURE = float(os.getenv("TEMPERATURE", 0.7))
+MAX_TOKENS = int(os.getenv("MAX_TOKENS", "1000"))
+
+# LLM に送る会話履歴の最大メッセージ数
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "40"))
+
+# ツール数がこの値以上のとき、選ばれたツール以外はスキーマを省いた要約だけを送る (0 で無効)
+LAZY_SCHEMA_MIN_TOOLS = int(os.getenv("LAZY_SCHEMA_MIN_TOOLS", "0"))
+# 完全なスキーマを送るツールの最大数と、要約時の説明文の最大文字数
+PROMOTED_TOOL_LIMIT = 8
+SUMMARY_DESCRIPTION_CHARS = 240
+_STUB_PARAMETERS = {"type": "object"}
+
+# 1 セッションで同時に実行するツール呼び出しの上限
+MAX_CONCURRENT_TOOLS = int(os.getenv("MAX_CONCURRENT_TOOLS", "8"))
+
+# コンソール出力をまとめて書き出すまでの最大待ち時間 (秒)
+STDOUT_FLUSH_DELAY = 0.02
+
+# 上流 LLM への HTTP コネクションプールの上限
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "128"))
+
 
 def _format_tools_for_litellm(
-    tools: List[Dict[str, Any]]
+    tools: List[Dict[str, Any]],
+    promoted: Optional[FrozenSet[str]] = None,
 ) -> List[Dict[str, Any]]:
-    """Format MCP tools to LiteLLM format"""
-    logger.debug(f"Formatting tools for LiteLLM: {tools}")
+    """Format MCP tools to LiteLLM format
+
+    When promoted is given, only those tools keep their full input schema;
+    the others are sent as a short summary with an open object schema.
+    Lists that are already in LiteLLM format are returned unchanged.
+    """
+    if tools and tools[0].get("type") == "function":
+        return tools
+    logger.debug("Formatting tools for LiteLLM: %s", tools)
     formatted = [
         {
             "type": "function",
@@ -22,12 +71,31 @@ def _format_tools_for_litellm(
                 "parameters": tool["input_schema"],
             },
         }
+        if promoted is None or tool["name"] in promoted
+        else {
+            "type": "function",
+            "function": {
+                "name": tool["name"],
+                "description": tool["description"][:SUMMARY_DESCRIPTION_CHARS],
+                "parameters": _STUB_PARAMETERS,
+            },
+        }
         for tool in tools
     ]
-    logger.debug(f"Formatted tools: {formatted}")
+    logger.debug("Formatted tools: %s", formatted)
     return formatted
 
 
+def _schema_retry_message(tool: Dict[str, Any]) -> str:
+    """Build the tool result returned for a call to a tool sent without its schema"""
+    schema = orjson.dumps(tool["input_schema"]).decode() if orjson is not None else json.dumps(tool["input_schema"])
+    return (
+        f"The tool {tool['name']} was not run because its parameter schema was not "
+        f"provided in this request. Its input schema is: {schema}. "
+        "If you still need it, call it again with arguments that match this schema."
+    )
+
+
 @dataclass
 class ChunkData:
     type: str
@@ -41,33 +109,156 @@ class ChunkProcessor(Protocol):
         ...
 
 
+class CoalescingStdoutWriter:
+    """Buffer console output and write it in batches
+
+    Text is flushed when it contains a newline, otherwise at most delay
+    seconds after the first buffered write, so a token stream costs one
+    write per batch instead of one per token.
+    """
+
+    def __init__(self, delay: float = STDOUT_FLUSH_DELAY):
+        self.delay = delay
+        self._buffer: List[str] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def write(self, text: str) -> None:
+        self._buffer.append(text)
+        if "\n" in text:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.delay, self.flush)
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buffer:
+            sys.stdout.write("".join(self._buffer))
+            self._buffer.clear()
+        sys.stdout.flush()
+
+
 class DefaultChunkProcessor:
     """Default implementation that prints chunks to console"""
+    def __init__(self):
+        self.writer = CoalescingStdoutWriter()
+
     async def process_chunk(self, chunk: ChunkData) -> None:
         if chunk.type == "content":
-            print(chunk.content, end="", flush=True)
+            self.writer.write(chunk.content)
         elif chunk.type == "tool_name":
-            print(f"\ntool_name: {chunk.content}, arguments: ", end="", flush=True)
+            self.writer.write(f"\ntool_name: {chunk.content}, arguments: ")
         elif chunk.type == "tool_args":
-            print(chunk.content, end="", flush=True)
+            self.writer.write(chunk.content)
+
+    def flush(self) -> None:
+        """Write out anything still buffered"""
+        self.writer.flush()
 
 
 class LLMClient:
     def __init__(self):
-        self.model = os.getenv("DEFAULT_MODEL", "claude-3-haiku-latest")
-        self.temperature = float(os.getenv("TEMPERATURE", 0.7))
-        self.max_tokens = int(os.getenv("MAX_TOKENS", "1000"))
+        self.model = DEFAULT_MODEL
+        self.temperature = TEMPERATURE
+        self.max_tokens = MAX_TOKENS
+        # 共有 HTTP セッション (最初に使われたイベントループ上で遅延生成する)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        # 直前に整形したツール一覧 (元のリスト, 要素数, 整形結果)
+        self._formatted_tools: Optional[Tuple[List[Dict[str, Any]], int, List[Dict[str, Any]]]] = None
+        # 直前に組み立てた acompletion の共通引数 (整形済みツール一覧, 引数)
+        self._base_completion_args: Optional[Tuple[Optional[List[Dict[str, Any]]], Dict[str, Any]]] = None
         logger.debug(f"Initialized LLMClient with model={self.model}, temperature={self.temperature}, max_tokens={self.max_tokens}")
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the keep-alive HTTP session bound to the running loop"""
+        loop = asyncio.get_running_loop()
+        session = self._session
+        if session is not None and not session.closed:
+            if self._session_loop is loop:
+                return session
+            if not self._session_loop.is_running():
+                raise RuntimeError(
+                    "The HTTP session belongs to an event loop that is no longer running; "
+                    "await aclose() on that loop before reusing the client"
+                )
+            # 別のループで動作中のセッションはそのループ上で閉じてから作り直す
+            asyncio.run_coroutine_threadsafe(session.close(), self._session_loop)
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT, ttl_dns_cache=300, keepalive_timeout=60
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+        self._session_loop = loop
+        return self._session
+
+    def prepare_tools(
+        self, tools: List[Dict[str, Any]], promoted: Optional[FrozenSet[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Format tools for LiteLLM, reusing the result while the same list is passed
+
+        With promoted, only those tools carry full schemas (see
+        _format_tools_for_litellm); that per-turn result is not cached.
+        """
+        if promoted is not None:
+            return _format_tools_for_litellm(tools, promoted)
+        cached = self._formatted_tools
+        if cached is not None and cached[0] is tools and cached[1] == len(tools):
+            return cached[2]
+        formatted = _format_tools_for_litellm(tools)
+        self._formatted_tools = (tools, len(tools), formatted)
+        return formatted
+
+    def _completion_args(self, formatted_tools: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Return the acompletion kwargs shared by every call with the same tools"""
+        cached = self._base_completion_args
+        if cached is not None and cached[0] is formatted_tools:
+            return cached[1]
+        completion_args = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stream": True,
+        }
+        if formatted_tools:
+            completion_args.update({
+                "tools": formatted_tools,
+                "tool_choice": "auto"
+            })
+        self._base_completion_args = (formatted_tools, completion_args)
+        return completion_args
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP session
+
+        May be awaited from any loop; the session is closed on the loop
+        it was created on (e.g. the web app's background loop).
+        """
+        session, loop = self._session, self._session_loop
+        self._session = None
+        self._session_loop = None
+        if session is None or session.closed:
+            return
+        if loop is asyncio.get_running_loop() or not loop.is_running():
+            await session.close()
+        else:
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+
     async def get_streaming_response(
         self,
         messages: List[Dict[str, str]],
         tools: Optional[List[Dict[str, Any]]] = None,
         tool_manager=None,
+        formatted_tools: Optional[List[Dict[str, Any]]] = None,
     ) -> Union[Tuple[List[Dict[str, Any]], Any], AsyncGenerator[str, None]]:
-        """Get response from LLM with tool calling support"""
+        """Get response from LLM with tool calling support
+
+        Pass formatted_tools (from prepare_tools) instead of tools to skip the
+        conversion to the LiteLLM format.
+        """
         try:
-            formatted_tools = _format_tools_for_litellm(tools) if tools else None
+            if formatted_tools is None and tools:
+                formatted_tools = self.prepare_tools(tools)
             return self._handle_streaming_response(messages, formatted_tools, tool_manager)
         except Exception as e:
             logger.error(f"Error getting LLM response: {e}", exc_info=True)
@@ -80,84 +271,203 @@ class LLMClient:
         tool_manager,
     ) -> AsyncGenerator[str, None]:
         """Handle streaming response from LLM"""
-        completion_args = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens,
-            "stream": True,
-        }
-
-        if formatted_tools:
-            completion_args.update({
-                "tools": formatted_tools,
-                "tool_choice": "auto"
-            })
-
-        logger.debug(f"Sending completion request with args: {completion_args}")
-        response = await acompletion(**completion_args)
+        completion_args = self._completion_args(formatted_tools)
+        logger.debug("Sending completion request with args: %s, messages: %s", completion_args, messages)
+        response = await acompletion(
+            messages=messages,
+            # リクエスト毎に TCP/TLS 接続を張り直さないよう共有セッションを使う
+            shared_session=self._get_session(),
+            **completion_args,
+        )
         logger.debug("Started receiving response stream")
 
         try:
+            if not formatted_tools:
+                # ツールなしの応答は本文だけを流す専用ループで処理する
+                async for chunk in response:
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        yield "content", content
+                return
+
             # Handle content chunks
             async for chunk in response:
+                # delta はチャンク毎に一度だけ取り出す
+                delta = chunk.choices[0].delta
+
                 # Handle regular content
-                if chunk.choices[0].delta.content:
-                    logger.debug(f"Content chunk: {chunk.choices[0].delta.content}")
-                    yield "content", chunk.choices[0].delta.content
+                content = getattr(delta, "content", None)
+                if content:
+                    logger.debug("Content chunk: %s", content)
+                    yield "content", content
                     continue
 
                 # Handle tool calls
-                tool_calls = getattr(chunk.choices[0].delta, "tool_calls", None)
+                tool_calls = getattr(delta, "tool_calls", None)
                 if not tool_calls:
                     continue
 
                 tool_call = tool_calls[0]
+                function = tool_call.function
                 if tool_call.id:
-                    assert tool_call.function.name
-                    logger.debug(f"Tool call: id={tool_call.id}, name={tool_call.function.name}")
+                    assert function.name
+                    logger.debug("Tool call: id=%s, name=%s", tool_call.id, function.name)
                     yield "tool_call_id", tool_call.id
-                    yield "tool_name", tool_call.function.name
-                if tool_call.function.arguments:
-                    logger.debug(f"Tool args: {tool_call.function.arguments}")
-                    yield "tool_args", tool_call.function.arguments
+                    yield "tool_name", function.name
+                arguments = function.arguments
+                if arguments:
+                    logger.debug("Tool args: %s", arguments)
+                    yield "tool_args", arguments
         except Exception as e:
             logger.error(f"Error in streaming response: {e}", exc_info=True)
             raise
 
 
 class ChatSession:
-    def __init__(self, llm_client: LLMClient, mcp_manager, chunk_processor: ChunkProcessor):
+    def __init__(self, llm_client: LLMClient, mcp_manager,
+                 chunk_processor: Optional[ChunkProcessor] = None,
+                 max_history: int = MAX_HISTORY_MESSAGES):
         self.llm_client = llm_client
         self.mcp_manager = mcp_manager
         self.chunk_processor = chunk_processor
-        self.messages = []
+        # LLM に渡す直近の履歴 (古いメッセージは自動的に捨てられる)
+        self.messages: Deque[Dict[str, Any]] = deque(maxlen=max_history)
+        # 直近に呼び出したツール名 (次のターンで完全なスキーマを送る)
+        self.recent_tools: Deque[str] = deque(maxlen=PROMOTED_TOOL_LIMIT)
+        # このターンでスキーマを省いて送ったツール (name -> ツール定義)
+        self._stubbed_tools: Dict[str, Dict[str, Any]] = {}
+        # 先行して開始したツール呼び出しが MCP サーバーに殺到しないよう同時実行数を絞る
+        self._tool_slots = asyncio.Semaphore(MAX_CONCURRENT_TOOLS)
         self.logger = logging.getLogger(__name__)
 
+    def load_history(self, messages: List[Dict[str, Any]]) -> None:
+        """Replace the context window with the tail of a persisted history"""
+        self.messages.clear()
+        self.messages.extend(messages[-self.messages.maxlen:])
+
+    def context_messages(self) -> List[Dict[str, Any]]:
+        """Return the context window as a list to send to the LLM
+
+        The window starts at its first user message. Tool results and
+        assistant messages whose preceding turn fell out of the window are
+        skipped, since LLM APIs reject orphaned tool messages and some
+        (e.g. Anthropic) require the conversation to start with a user turn.
+        """
+        start = 0
+        for message in self.messages:
+            if message["role"] == "user":
+                break
+            start += 1
+        else:
+            # ユーザーメッセージが窓に無い (長いツールループ) 場合は先頭の tool だけ飛ばす
+            start = 0
+            for message in self.messages:
+                if message["role"] != "tool":
+                    break
+                start += 1
+        # 先頭を飛ばす場合もリストのコピーは一度だけにする
+        return list(islice(self.messages, start, None)) if start else list(self.messages)
+
+    def promoted_tools(self, tools: Optional[List[Dict[str, Any]]]) -> Optional[FrozenSet[str]]:
+        """Pick the tools whose full schema is sent this turn
+
+        Returns None (send every schema) unless there are at least
+        LAZY_SCHEMA_MIN_TOOLS tools. Otherwise the recently called tools
+        are promoted first, then tools whose name words appear in the
+        latest user message. The tools left out are remembered for the turn
+        so calls to them are not executed (see _execute_tool_call).
+        """
+        if not tools or not LAZY_SCHEMA_MIN_TOOLS or len(tools) < LAZY_SCHEMA_MIN_TOOLS:
+            self._stubbed_tools = {}
+            return None
+        promoted = dict.fromkeys(reversed(self.recent_tools))
+        user_text = next(
+            (m.get("content") or "" for m in reversed(self.messages) if m["role"] == "user"), ""
+        ).lower()
+        for tool in tools:
+            if len(promoted) >= PROMOTED_TOOL_LIMIT:
+                break
+            words = re.split(r"[^0-9a-z]+", tool["name"].lower())
+            if any(len(word) >= 3 and word in user_text for word in words):
+                promoted.setdefault(tool["name"])
+        promoted = frozenset(list(promoted)[:PROMOTED_TOOL_LIMIT])
+        self._stubbed_tools = {
+            tool["name"]: tool for tool in tools if tool["name"] not in promoted
+        }
+        return promoted
+
+    def start_tool_call(self, tool_call: Dict) -> Dict:
+        """Start executing a completed tool call in the background
+
+        The task is stored under tool_call["task"] and awaited by
+        process_tool_calls, so tools can run while the rest of the LLM
+        response is still streaming.
+        """
+        self.recent_tools.append(tool_call["name"])
+        tool_call["task"] = asyncio.ensure_future(self._execute_tool_call(tool_call))
+        return tool_call
+
+    @staticmethod
+    def cancel_tool_calls(tool_calls: List[Dict]) -> None:
+        """Cancel tool calls started by start_tool_call that have not finished
+
+        Used when a turn is abandoned (stream error, client disconnect) so
+        tools no longer keep running against the MCP servers.
+        """
+        for tool_call in tool_calls:
+            task = tool_call.get("task")
+            if task is not None and not task.done():
+                task.cancel()
+
     async def process_tool_calls(self, tool_calls: List[Dict]) -> List[Dict]:
         """Process tool calls and generate tool messages"""
-        tool_messages = []
         for tool_call in tool_calls:
-            tool_message = await self._execute_tool_call(tool_call)
-            if tool_message:
-                tool_messages.append(tool_message)
+            if "task" not in tool_call:
+                self.start_tool_call(tool_call)
+        # 独立したツール呼び出しは並行に実行する (結果の順序は呼び出し順のまま)
+        results = await asyncio.gather(
+            *(tool_call["task"] for tool_call in tool_calls),
+            return_exceptions=True,
+        )
+        tool_messages = []
+        for tool_call, result in zip(tool_calls, results):
+            if isinstance(result, BaseException):
+                self.logger.error("Error executing tool %s: %s", tool_call["name"], result)
+            elif result:
+                tool_messages.append(result)
         return tool_messages
 
     async def _execute_tool_call(self, tool_call: Dict) -> Optional[Dict]:
         """Execute a single tool call and return the corresponding message"""
         tool_name = tool_call["name"]
+        stubbed = self._stubbed_tools.get(tool_name)
+        if stubbed is not None:
+            # スキーマを知らずに推測した引数で副作用のあるツールを動かさない。
+            # 完全なスキーマを返して呼び直してもらう (次のターンでは昇格済み)
+            self.logger.info("Not running %s: its schema was not sent this turn", tool_name)
+            # 次のターンで確実に完全なスキーマを送るよう、最も新しい呼び出しとして扱う
+            if tool_name in self.recent_tools:
+                self.recent_tools.remove(tool_name)
+            self.recent_tools.append(tool_name)
+            return {
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "name": tool_name,
+                "content": _schema_retry_message(stubbed),
+            }
         try:
             tool_args = tool_call["arguments"]
             if isinstance(tool_args, str):
                 try:
-                    tool_args = json.loads(tool_args)
-                except json.JSONDecodeError:
+                    tool_args = orjson.loads(tool_args) if orjson is not None else json.loads(tool_args)
+                except ValueError:  # orjson / json の JSONDecodeError はどちらも ValueError
                     tool_args = {}
 
-            self.logger.debug(f"Executing tool {tool_name} with args: {tool_args}")
+            self.logger.debug("Executing tool %s with args: %s", tool_name, tool_args)
             
-            result = await self.mcp_manager.call_tool(tool_name, tool_args)
-            self.logger.debug(f"Tool execution result: {result}")
+            async with self._tool_slots:
+                result = await self.mcp_manager.call_tool(tool_name, tool_args)
+            self.logger.debug("Tool execution result: %s", result)
             
             content = ""
             if result and hasattr(result, 'content') and result.content:
@@ -171,7 +481,7 @@ class ChatSession:
                 "name": tool_name,
                 "content": content,
             }
-            self.logger.debug(f"Created tool message: {tool_message}")
+            self.logger.debug("Created tool message: %s", tool_message)
             return tool_message
             
         except Exception as e:
@@ -182,21 +492,32 @@ class ChatSession:
         """Process LLM response and collect content chunks and tool calls"""
         content_chunks = []
         tool_calls = []
-        current_tool = {"id": None, "name": None, "arguments": ""}
+        # arguments は断片のリストとして溜め、確定時に一度だけ連結する
+        current_tool = {"id": None, "name": None, "arguments": []}
 
-        async for chunk_type, chunk in response:
-            # Create ChunkData and process it
-            chunk_data = ChunkData(type=chunk_type, content=chunk)
-            await self.chunk_processor.process_chunk(chunk_data)
-
-            # Store chunks and tool calls
-            if chunk_type == "content":
-                content_chunks.append(chunk)
-            else:
-                await self._handle_tool_chunk(chunk_type, chunk, current_tool, tool_calls)
+        try:
+            async for chunk_type, chunk in response:
+                # Create ChunkData and process it
+                if self.chunk_processor is not None:
+                    await self.chunk_processor.process_chunk(ChunkData(type=chunk_type, content=chunk))
+
+                # Store chunks and tool calls
+                if chunk_type == "content":
+                    content_chunks.append(chunk)
+                else:
+                    await self._handle_tool_chunk(chunk_type, chunk, current_tool, tool_calls)
+        except BaseException:
+            # 応答が途中で失敗したら、先行して開始したツール呼び出しを止める
+            self.cancel_tool_calls(tool_calls)
+            raise
 
         if current_tool["name"]:  # Add the last tool call if exists
-            tool_calls.append(self._create_tool_call(current_tool))
+            tool_calls.append(self.create_tool_call(current_tool))
+
+        # 出力をまとめて書くプロセッサは応答の終わりで残りを吐き出す
+        flush = getattr(self.chunk_processor, "flush", None)
+        if flush is not None:
+            flush()
 
         return content_chunks, tool_calls
 
@@ -204,26 +525,88 @@ class ChatSession:
                                 current_tool: Dict, tool_calls: List[Dict]) -> None:
         """Handle different types of tool chunks in the response"""
         if chunk_type == "tool_call_id":
-            if current_tool["name"]:  # Save previous tool call if exists
-                tool_calls.append(self._create_tool_call(current_tool))
-            current_tool.update({"id": chunk, "name": None, "arguments": ""})
+            if current_tool["name"]:  # Save previous tool call and start it right away
+                tool_calls.append(self.start_tool_call(self.create_tool_call(current_tool)))
+            current_tool.update({"id": chunk, "name": None, "arguments": []})
         
         elif chunk_type == "tool_name":
             current_tool["name"] = chunk
         
         elif chunk_type == "tool_args":
-            current_tool["arguments"] = chunk
+            current_tool["arguments"].append(chunk)
+
+    @staticmethod
+    def create_assistant_message(content_chunks: List[str], tool_calls: List[Dict]) -> Dict:
+        """Build the assistant message that carries a response's tool calls"""
+        return {
+            "role": "assistant",
+            "content": "".join(content_chunks),
+            "tool_calls": [tool_call["llm_payload"] for tool_call in tool_calls],
+        }
 
     @staticmethod
-    def _create_tool_call(tool_info: Dict) -> Dict:
+    def create_tool_call(tool_info: Dict) -> Dict:
         """Create a tool call dictionary from tool info"""
+        tool_id = tool_info["id"]
+        name = tool_info["name"]
+        arguments = "".join(tool_info["arguments"])
         return {
-            "id": tool_info["id"],
-            "name": tool_info["name"],
-            "arguments": tool_info["arguments"]
+            "id": tool_id,
+            "name": name,
+            "arguments": arguments,
+            # アシスタントメッセージに載せる形は確定時に一度だけ作る
+            "llm_payload": {
+                "id": tool_id,
+                "type": "function",
+                "function": {"name": name, "arguments": arguments},
+            },
         }
 
 
+class _StdinReader:
+    """Read console input lines on a daemon thread
+
+    input() cannot be interrupted, so a read running in the default executor
+    keeps asyncio.run from returning after Ctrl-C. The thread reads the raw
+    file descriptor, because a daemon thread blocked inside sys.stdin would
+    abort the interpreter at exit while holding its buffer lock.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._requests: "queue.Queue[None]" = queue.Queue()
+        self._lines: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        threading.Thread(target=self._run, name="stdin-reader", daemon=True).start()
+
+    def _run(self) -> None:
+        fd = sys.stdin.fileno()
+        buffer = b""
+        while True:
+            self._requests.get()
+            while b"\n" not in buffer:
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    break
+                buffer += chunk
+            raw, newline, buffer = buffer.partition(b"\n")
+            # 改行の無い末尾も 1 行として返し、その後は EOF を返す
+            line = raw.decode(errors="replace").rstrip("\r") if raw or newline else None
+            try:
+                self._loop.call_soon_threadsafe(self._lines.put_nowait, line)
+            except RuntimeError:
+                # イベントループが既に閉じている
+                return
+
+    async def readline(self, prompt: str) -> str:
+        """Show prompt and return the next line, raising EOFError at end of input"""
+        print(prompt, end="", flush=True)
+        self._requests.put(None)
+        line = await self._lines.get()
+        if line is None:
+            raise EOFError
+        return line
+
+
 async def interactive_chat(
     llm_client: LLMClient,
     mcp_manager,
@@ -238,31 +621,47 @@ async def interactive_chat(
     
     session = ChatSession(llm_client, mcp_manager, chunk_processor)
     tools = await mcp_manager.list_all_tools()
-    logger.debug(f"Available tools: {json.dumps(tools, indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Available tools: %s", json.dumps(tools, indent=2))
+    # ツール定義の変換はセッション開始時に一度だけ行う
+    formatted_tools = llm_client.prepare_tools(tools) if tools else None
+    # 入力待ちの間もイベントループ上のバックグラウンド処理を止めない
+    stdin = _StdinReader()
 
     while True:
         try:
-            user_input = input("\nYou: ").strip()
+            user_input = (await stdin.readline("\nYou: ")).strip()
             if user_input.lower() == "quit":
                 break
 
             session.messages.append({"role": "user", "content": user_input})
-            await process_chat_turn(session, tools)
+            await process_chat_turn(session, formatted_tools, tools)
 
+        except EOFError:
+            break
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            # Ctrl-C で入力待ちや応答の途中でも終了する
+            print()
+            break
         except Exception as e:
             logger.error(f"Error in chat loop: {str(e)}")
             print(f"\nError: {str(e)}")
 
 
-async def process_chat_turn(session: ChatSession, tools: List[Dict]):
+async def process_chat_turn(session: ChatSession, formatted_tools: Optional[List[Dict]],
+                            tools: Optional[List[Dict]] = None):
     """Process a single turn in the chat conversation"""
     while True:
         print("\nAssistant:", end=" ")
-        
+
+        promoted = session.promoted_tools(tools)
+        if promoted is not None:
+            formatted_tools = session.llm_client.prepare_tools(tools, promoted)
+
         response = await session.llm_client.get_streaming_response(
-            messages=session.messages,
-            tools=tools,
+            messages=session.context_messages(),
             tool_manager=session.mcp_manager,
+            formatted_tools=formatted_tools,
         )
 
         content_chunks, tool_calls = await session.process_llm_response(response)
@@ -281,18 +680,21 @@ async def process_chat_turn(session: ChatSession, tools: List[Dict]):
 if __name__ == "__main__":
     from mcp_config import load_mcp_config
     from mcp_client import MCPClientManager
-    import dotenv
     import asyncio
 
-    dotenv.load_dotenv()
-
     async def main():
         # 設定の読み込みとMCPマネージャーの初期化
         configs = load_mcp_config("mcp_config.json")
         llm_client = LLMClient()
 
-        async with MCPClientManager(configs) as mcp_manager:
-            # 対話セッションの開始（ストリーミングモード）
-            await interactive_chat(llm_client, mcp_manager)
-
-    asyncio.run(main())
\ No newline at end of file
+        try:
+            async with MCPClientManager(configs) as mcp_manager:
+                # 対話セッションの開始（ストリーミングモード）
+                await interactive_chat(llm_client, mcp_manager)
+        finally:
+            await llm_client.aclose()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
\ No newline at end of file
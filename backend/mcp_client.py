@@ -1,8 +1,17 @@
 import asyncio
+import functools
+import json
 import logging
+import sys
+from collections import OrderedDict
 from typing import Dict, Optional, List, Any, Tuple
 from contextlib import AsyncExitStack
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
@@ -13,6 +22,20 @@ from mcp_config import MCPServerConfig
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# cacheable_tools の呼び出し結果を保持する件数
+CALL_CACHE_SIZE = 256
+# これより速く終わる呼び出しはキャッシュしない (秒)
+CALL_CACHE_MIN_SECONDS = 0.05
+
+
+def _args_key(tool_args: Any):
+    """Serialize tool arguments into a hashable, key-order independent cache key"""
+    if orjson is not None:
+        return orjson.dumps(
+            tool_args, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(tool_args, sort_keys=True, default=str)
+
 
 def make_prefixed_tool_name(server_id: str, tool_name: str) -> str:
     """Create a prefixed tool name from server_id and original tool name"""
@@ -21,11 +44,18 @@ def make_prefixed_tool_name(server_id: str, tool_name: str) -> str:
 
 class MCPClient:
     def __init__(self, server_id: str, config: MCPServerConfig):
-        self.server_id = server_id
+        self.server_id = sys.intern(server_id)
+        # ツール名の前に付ける "{server_id}_" は接続ごとに作り直さない
+        self._prefix = make_prefixed_tool_name(self.server_id, "")
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
         self.config = config
         self._tools: Optional[List[dict]] = None
+        # (tool_name, 正規化した引数) -> 結果 の LRU
+        self._call_cache: OrderedDict[Tuple[str, Any], Any] = OrderedDict()
+        # 実行中の呼び出し。同じ引数の呼び出しは結果を共有する
+        self._inflight: Dict[Tuple[str, Any], asyncio.Task] = {}
+        self._cacheable_tools = frozenset(config.cacheable_tools)
 
     async def __aenter__(self):
         await self.connect()
@@ -48,21 +78,30 @@ class MCPClient:
             ClientSession(stdio, write)
         )
         await self.session.initialize()
+        await self.refresh_tools()
 
-        # Cache available tools
+    async def refresh_tools(self):
+        """Fetch the tool list from the server and cache it"""
         response = await self.session.list_tools()
-        logger.debug(f"Raw tools from server {self.server_id}: {response.tools}")
+        logger.debug("Raw tools from server %s: %s", self.server_id, response.tools)
 
+        # ツール名は _tool_mapping のキーとして毎回引かれるので intern しておく
+        prefix = self._prefix
         self._tools = [
             {
-                "name": make_prefixed_tool_name(self.server_id, tool.name),
+                "name": sys.intern(prefix + tool.name),
                 "description": tool.description,
                 "input_schema": tool.inputSchema,
-                "original_name": tool.name,
+                "original_name": sys.intern(tool.name),
             }
             for tool in response.tools
         ]
-        logger.debug(f"Processed tools for server {self.server_id}: {self._tools}")
+        logger.debug("Processed tools for server %s: %s", self.server_id, self._tools)
+
+    @property
+    def tools(self) -> List[dict]:
+        """Tools fetched by the last connect/refresh_tools (empty if not connected)"""
+        return self._tools or []
 
     async def list_tools(self) -> List[dict]:
         """List available tools from the server"""
@@ -87,12 +126,54 @@ class MCPClient:
         if self.session is None:
             raise RuntimeError("Client not connected to server")
 
-        logger.debug(f"Calling tool {tool_name} with args: {tool_args}")
-        return await self.session.call_tool(tool_name, tool_args)
+        logger.debug("Calling tool %s with args: %s", tool_name, tool_args)
+        if tool_name not in self._cacheable_tools:
+            return await self.session.call_tool(tool_name, tool_args)
+
+        key = (tool_name, _args_key(tool_args))
+        if key in self._call_cache:
+            self._call_cache.move_to_end(key)
+            logger.debug("Cache hit for tool %s", tool_name)
+            return self._call_cache[key]
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call_and_cache(key, tool_name, tool_args))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._call_done, key))
+        else:
+            logger.debug("Joining in-flight call for tool %s", tool_name)
+        # 呼び出し元 (最初の呼び出し元も含む) がキャンセルされても、共有している実行は止めない
+        return await asyncio.shield(task)
+
+    async def _call_and_cache(self, key: Tuple[str, Any], tool_name: str, tool_args: Any) -> Any:
+        """Call a cacheable tool and cache its result if it was slow enough"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await self.session.call_tool(tool_name, tool_args)
+        # 軽い呼び出しやエラー結果はキャッシュしない
+        if (loop.time() - started >= CALL_CACHE_MIN_SECONDS
+                and not getattr(result, "isError", False)):
+            self._call_cache[key] = result
+            if len(self._call_cache) > CALL_CACHE_SIZE:
+                self._call_cache.popitem(last=False)
+        return result
+
+    def _call_done(self, key: Tuple[str, Any], task: asyncio.Task) -> None:
+        """Forget a finished in-flight call"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 待っていた呼び出し元が全員キャンセルされていても警告を出さない
+        if not task.cancelled():
+            task.exception()
 
     async def cleanup(self):
         """Clean up resources"""
+        for task in list(self._inflight.values()):
+            task.cancel()
         await self.exit_stack.aclose()
+        self.session = None
+        self._tools = None
+        self._call_cache.clear()
 
 
 class MCPClientManager:
@@ -102,15 +183,21 @@ class MCPClientManager:
         Args:
             server_configs: Dict mapping server IDs to their configurations
         """
-        self.exit_stack = AsyncExitStack()
         self.clients: Dict[str, MCPClient] = {
             server_id: MCPClient(server_id, config)
             for server_id, config in server_configs.items()
         }
-        self._tool_mapping: Dict[str, Tuple[str, str]] = (
+        self._tool_mapping: Dict[str, Tuple[MCPClient, str]] = (
             {}
-        )  # prefixed_name -> (server_id, original_name)
+        )  # prefixed_name -> (client, original_name)
+        # list_all_tools の結果 (接続中は同じリストを返す)
+        self._all_tools: Optional[List[dict]] = None
         self._connected = False
+        # connect_all の二重実行を防ぐ
+        self._connect_lock = asyncio.Lock()
+        # 各クライアントの接続を保持するタスクと、その終了合図
+        self._client_tasks: List[asyncio.Task] = []
+        self._stop_event: Optional[asyncio.Event] = None
 
     async def __aenter__(self):
         await self.connect_all()
@@ -119,40 +206,72 @@ class MCPClientManager:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.cleanup_all()
 
-    def _split_tool_name(self, prefixed_name: str) -> Tuple[str, str]:
-        """Split prefixed tool name into server_id and original tool name"""
-        if prefixed_name not in self._tool_mapping:
+    def _resolve_tool(self, prefixed_name: str) -> Tuple[MCPClient, str]:
+        """Resolve prefixed tool name into its client and original tool name"""
+        try:
+            return self._tool_mapping[prefixed_name]
+        except KeyError:
             logger.error(
-                f"Tool {prefixed_name} not found in mapping. Available tools: {self._tool_mapping}"
+                f"Tool {prefixed_name} not found in mapping. Available tools: {list(self._tool_mapping)}"
             )
-            raise ValueError(f"Unknown tool: {prefixed_name}")
-        return self._tool_mapping[prefixed_name]
+            raise ValueError(f"Unknown tool: {prefixed_name}") from None
+
+    async def _serve_client(self, client: MCPClient, ready: asyncio.Future):
+        """Keep one client connected until cleanup_all is called"""
+        # stdio_client と ClientSession は内部で anyio のタスクグループを使うため、
+        # コンテキストへの出入りは同じタスクで行う必要がある
+        try:
+            async with client:
+                ready.set_result(None)
+                await self._stop_event.wait()
+        except Exception as e:
+            if not ready.done():
+                # 途中まで入ったコンテキストも同じタスク内で閉じる
+                await client.cleanup()
+                ready.set_exception(e)
+            else:
+                logger.error(f"Error while disconnecting from server {client.server_id}: {e}")
+        finally:
+            if not ready.done():
+                ready.cancel()
 
     async def connect_all(self):
-        """Connect to all configured servers and build tool mapping"""
-        if self._connected:
-            return
+        """Connect to all configured servers concurrently and build tool mapping"""
+        async with self._connect_lock:
+            if self._connected:
+                return
+
+            self._stop_event = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            readies = []
+            for client in self.clients.values():
+                ready = loop.create_future()
+                self._client_tasks.append(
+                    asyncio.create_task(self._serve_client(client, ready))
+                )
+                readies.append(ready)
+
+            # サブプロセスの起動と initialize ハンドシェイクを全サーバー並行で待つ
+            results = await asyncio.gather(*readies, return_exceptions=True)
+            for (server_id, client), result in zip(self.clients.items(), results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Failed to connect to server {server_id}: {result}")
+                    continue
 
-        for server_id, client in self.clients.items():
-            try:
-                await self.exit_stack.enter_async_context(client)
                 # Update tool mapping after successful connection
-                tools = await client.list_tools()
-                logger.debug(f"Tools from server {server_id}: {tools}")
+                # (ツール一覧は connect 時に取得済みなのでそのまま使う)
+                tools = client.tools
+                logger.debug("Tools from server %s: %s", server_id, tools)
 
                 for tool in tools:
                     self._tool_mapping[tool["name"]] = (
-                        server_id,
+                        client,
                         tool["original_name"],
                     )
 
-                logger.debug(f"Updated tool mapping: {self._tool_mapping}")
-
-            except Exception as e:
-                logger.error(f"Failed to connect to server {server_id}: {e}")
-                continue
-
-        self._connected = True
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Updated tool mapping: %s", list(self._tool_mapping))
+            self._connected = True
 
     async def list_all_tools(self) -> List[dict]:
         """List all available tools from all servers
@@ -162,6 +281,8 @@ class MCPClientManager:
         """
         if not self._connected:
             raise RuntimeError("Clients are not connected. Call connect_all() first.")
+        if self._all_tools is not None:
+            return self._all_tools
 
         all_tools = []
         for client in self.clients.values():
@@ -170,8 +291,34 @@ class MCPClientManager:
                 all_tools.extend(tools)
             except Exception as e:
                 logger.error(f"Failed to list tools for server {client.server_id}: {e}")
+        self._all_tools = all_tools
         return all_tools
 
+    async def refresh_tools(self) -> List[dict]:
+        """Re-fetch the tool lists from all connected servers
+
+        Returns:
+            The new list of all available tools
+        """
+        if not self._connected:
+            raise RuntimeError("Clients are not connected. Call connect_all() first.")
+
+        # 更新中も call_tool が古い対応表で動けるよう、新しい対応表を作ってから差し替える
+        tool_mapping: Dict[str, Tuple[MCPClient, str]] = {}
+        for server_id, client in self.clients.items():
+            if client.session is None:
+                continue
+            try:
+                await client.refresh_tools()
+            except Exception as e:
+                # 失敗したサーバーは以前のツール一覧のまま残す (list_all_tools と揃える)
+                logger.error(f"Failed to refresh tools for server {server_id}: {e}")
+            for tool in client.tools:
+                tool_mapping[tool["name"]] = (client, tool["original_name"])
+        self._tool_mapping = tool_mapping
+        self._all_tools = None
+        return await self.list_all_tools()
+
     async def call_tool(self, prefixed_tool_name: str, tool_args: Any) -> Any:
         """Call a specific tool using its prefixed name
 
@@ -190,17 +337,19 @@ class MCPClientManager:
             raise RuntimeError("Clients are not connected. Call connect_all() first.")
 
         logger.debug(
-            f"Attempting to call tool: {prefixed_tool_name} with args: {tool_args}"
+            "Attempting to call tool: %s with args: %s", prefixed_tool_name, tool_args
+        )
+        client, original_name = self._resolve_tool(prefixed_tool_name)
+        logger.debug(
+            "Resolved to server: %s, original tool: %s", client.server_id, original_name
         )
-        server_id, original_name = self._split_tool_name(prefixed_tool_name)
-        logger.debug(f"Resolved to server: {server_id}, original tool: {original_name}")
 
-        return await self.clients[server_id].call_tool(original_name, tool_args)
+        return await client.call_tool(original_name, tool_args)
 
     async def call_tools(
         self, tool_calls: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
-        """Call multiple tools
+        """Call multiple tools concurrently
 
         Args:
             tool_calls: List of tool call specifications, each containing:
@@ -216,26 +365,34 @@ class MCPClientManager:
         if not self._connected:
             raise RuntimeError("Clients are not connected. Call connect_all() first.")
 
-        results = []
-        for call in tool_calls:
-            prefixed_name = call["tool_name"]
-            try:
-                result = await self.call_tool(prefixed_name, call["tool_args"])
-                results.append({"tool_name": prefixed_name, "result": result})
-            except Exception as e:
-                logger.error(f"Error calling tool {prefixed_name}: {e}", exc_info=True)
-                results.append({"tool_name": prefixed_name, "error": str(e)})
-        return results
+        # 呼び出しは互いに独立しているので並行に実行する (結果は入力順)
+        return await asyncio.gather(*(self._dispatch(call) for call in tool_calls))
+
+    async def _dispatch(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one call_tools entry and shape its result"""
+        prefixed_name = call["tool_name"]
+        try:
+            result = await self.call_tool(prefixed_name, call["tool_args"])
+            return {"tool_name": prefixed_name, "result": result}
+        except Exception as e:
+            logger.error(f"Error calling tool {prefixed_name}: {e}", exc_info=True)
+            return {"tool_name": prefixed_name, "error": str(e)}
 
     async def cleanup_all(self):
         """Clean up all client resources"""
-        await self.exit_stack.aclose()
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self._client_tasks:
+            await asyncio.gather(*self._client_tasks, return_exceptions=True)
+        self._client_tasks = []
+        self._stop_event = None
+        self._tool_mapping.clear()
+        self._all_tools = None
         self._connected = False
 
 
 if __name__ == "__main__":
     from mcp_config import load_mcp_config
-    import json
 
     async def main():
         # Load configurations
@@ -249,7 +406,11 @@ if __name__ == "__main__":
             for tool in all_tools:
                 print(f"- {tool['name']}: {tool['description']}")
 
-            print("\nTool mapping:", json.dumps(manager._tool_mapping, indent=2))
+            tool_mapping = {
+                name: (client.server_id, original_name)
+                for name, (client, original_name) in manager._tool_mapping.items()
+            }
+            print("\nTool mapping:", json.dumps(tool_mapping, indent=2))
 
             # Example tool calls
             tool_calls = [
@@ -1,32 +1,54 @@
+import functools
 import json
+import os
 from dataclasses import dataclass
-from typing import Dict
+from types import MappingProxyType
+from typing import Mapping
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class MCPServerConfig:
     command: str
-    args: list[str]
+    args: tuple[str, ...]
+    # 結果をキャッシュしてよい (副作用がなく同じ引数なら同じ結果を返す) ツール名
+    cacheable_tools: tuple[str, ...] = ()
 
 
-def load_mcp_config(config_path: str) -> Dict[str, MCPServerConfig]:
+def load_mcp_config(config_path: str) -> Mapping[str, MCPServerConfig]:
     """Load MCP server configurations from a JSON file
 
     Args:
         config_path: Path to the JSON config file
 
     Returns:
-        Dict mapping server IDs to their configurations
+        Read-only mapping of server IDs to their configurations.
+        Unchanged files return the same cached mapping.
 
     Raises:
         FileNotFoundError: If config file is not found
         json.JSONDecodeError: If config file is not valid JSON
     """
-    with open(config_path) as f:
-        config = json.load(f)
-        return {
-            server_id: MCPServerConfig(
-                command=server_config["command"], args=server_config["args"]
-            )
-            for server_id, server_config in config["mcpServers"].items()
-        }
+    config_path = os.path.abspath(config_path)
+    return _load_cached(config_path, os.stat(config_path).st_mtime_ns)
+
+
+# 戻り値は共有されるので、dict は読み取り専用にし、設定は frozen にしておく
+@functools.lru_cache(maxsize=8)
+def _load_cached(config_path: str, mtime_ns: int) -> Mapping[str, MCPServerConfig]:
+    with open(config_path, "rb") as f:
+        data = f.read()
+    # orjson.JSONDecodeError は json.JSONDecodeError のサブクラス
+    config = orjson.loads(data) if orjson is not None else json.loads(data)
+    return MappingProxyType({
+        server_id: MCPServerConfig(
+            command=server_config["command"],
+            args=tuple(server_config["args"]),
+            cacheable_tools=tuple(server_config.get("cacheableTools", ())),
+        )
+        for server_id, server_config in config["mcpServers"].items()
+    })
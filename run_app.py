@@ -9,6 +9,11 @@ from backend.app import create_app
 import signal
 from contextlib import asynccontextmanager
 
+try:
+    import uvloop  # Windows には無いので任意
+except ImportError:
+    uvloop = None
+
 
 def setup_logger(debug_mode: bool) -> logging.Logger:
     """Set up logging configuration"""
@@ -54,6 +59,9 @@ def main():
     logger.info(f"Starting app with debug={args.debug}, window-debug={args.window_debug}")
 
     # Initialize event loop and MCP manager
+    # (uvloop があればバックエンドの常駐ループも含めて uvloop を使う)
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
 
@@ -87,10 +95,13 @@ def main():
             signal.signal(signal.SIGTERM, cleanup)
             
             # Start webview
-            webview.start(
-                debug=args.window_debug,
-                http_port=args.port
-            )
+            try:
+                webview.start(
+                    debug=args.window_debug,
+                    http_port=args.port
+                )
+            finally:
+                await chat_manager.aclose()
 
     try:
         loop.run_until_complete(setup_app())
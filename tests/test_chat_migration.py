@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import backend.app as app_module  # noqa: E402
+from backend.chat_store import LogChatStore, SQLiteChatStore  # noqa: E402
+
+
+class MigrateJsonChatsTest(unittest.TestCase):
+    """Existing JSON chats should be imported into the configured store once"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.chats_dir = self._tmp.name
+        patcher = mock.patch.object(app_module, "CHATS_DIR", self.chats_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.chat = {
+            "id": "c1",
+            "created_at": "2024-01-01T00:00:00",
+            "messages": [
+                {"role": "user", "content": "hello", "timestamp": "2024-01-01T00:00:01"},
+                {"role": "assistant", "content": "hi", "timestamp": "2024-01-01T00:00:02"},
+            ],
+        }
+        self._write_json("c1", self.chat)
+
+    def _write_json(self, chat_id, data):
+        with open(os.path.join(self.chats_dir, f"{chat_id}.json"), "w") as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+
+    def _assert_imported(self, store):
+        app_module._migrate_json_chats(store.save, "test")
+
+        self.assertEqual(store.load("c1"), self.chat)
+        self.assertFalse(os.path.exists(os.path.join(self.chats_dir, "c1.json")))
+        # 二回目は何もしない
+        app_module._migrate_json_chats(store.save, "test")
+        self.assertEqual(store.load("c1"), self.chat)
+
+    def test_sqlite(self):
+        self._assert_imported(SQLiteChatStore(os.path.join(self.chats_dir, "chats.sqlite3")))
+
+    def test_log(self):
+        store = LogChatStore(self.chats_dir)
+        self._assert_imported(store)
+        self.assertEqual([chat["id"] for chat in store.list_chats()], ["c1"])
+
+    def test_broken_file_is_left_in_place(self):
+        self._write_json("broken", "{not json")
+        store = SQLiteChatStore(os.path.join(self.chats_dir, "chats.sqlite3"))
+
+        with self.assertLogs(app_module.logger, "WARNING") as logs:
+            app_module._migrate_json_chats(store.save, "test")
+
+        self.assertTrue(os.path.exists(os.path.join(self.chats_dir, "broken.json")))
+        self.assertIsNone(store.load("broken"))
+        self.assertEqual(store.load("c1"), self.chat)
+        self.assertIn("1 chat files were left", logs.output[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
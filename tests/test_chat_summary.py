@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import backend.app as app_module  # noqa: E402
+
+
+class ReadChatSummaryTest(unittest.TestCase):
+    """_read_chat_summary should not parse the message history"""
+
+    MESSAGE_COUNT = 3000
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = mock.patch.object(app_module, "CHATS_DIR", self._tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.messages = [
+            {"role": "user", "content": f"message {i}", "timestamp": "2024-01-01T00:00:00"}
+            for i in range(self.MESSAGE_COUNT)
+        ]
+
+    def _count_events(self, path):
+        """Run _read_chat_summary and return (summary, parser events consumed)"""
+        parse = app_module.ijson.parse
+        consumed = 0
+
+        def counting_parse(*args, **kwargs):
+            nonlocal consumed
+            for event in parse(*args, **kwargs):
+                consumed += 1
+                yield event
+
+        with mock.patch.object(app_module.ijson, "parse", counting_parse):
+            summary = app_module._read_chat_summary(path)
+        return summary, consumed
+
+    def test_saved_chat_stops_at_first_message(self):
+        data = app_module._new_chat("c1")
+        data["messages"] = self.messages
+        app_module.save_chat("c1", data)
+
+        summary, consumed = self._count_events(app_module._chat_path("c1"))
+
+        self.assertEqual(summary, {
+            "id": "c1", "created_at": data["created_at"], "preview": "message 0",
+        })
+        self.assertLess(consumed, 20)
+
+    def test_created_at_after_messages_is_read_from_the_tail(self):
+        path = os.path.join(self._tmp.name, "old.json")
+        with open(path, "w") as f:
+            json.dump({"id": "old", "messages": self.messages, "created_at": "2023-05-06T07:08:09"}, f)
+
+        summary, consumed = self._count_events(path)
+
+        self.assertEqual(summary, {
+            "id": "old", "created_at": "2023-05-06T07:08:09", "preview": "message 0",
+        })
+        self.assertLess(consumed, 20)
+
+    def test_empty_chat(self):
+        app_module.save_chat("empty", app_module._new_chat("empty"))
+
+        summary, _ = self._count_events(app_module._chat_path("empty"))
+
+        self.assertEqual(summary["preview"], "New chat")
+        self.assertIsNotNone(summary["created_at"])
+
+
+if __name__ == "__main__":
+    unittest.main()